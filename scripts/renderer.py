@@ -4,7 +4,9 @@ import curses
 import dataclasses
 import enum
 import logging
+import math
 import sys
+import time
 
 from orca.grid import (
     BANG_GLYPH,
@@ -12,12 +14,17 @@ from orca.grid import (
     CURSOR_GLYPH,
     DOT_GLYPH,
     EMPTY_GLYPH,
+    IS_UPPER_CASE_TABLE,
+    LOWER_CASE_TABLE,
     OrcaGrid,
 )
 
 
 logger = logging.getLogger(__name__)
 
+# Minimum time between two redraws of the screen, in seconds
+FRAME_PERIOD = 1 / 30
+
 
 @contextlib.contextmanager
 def noecho():
@@ -82,6 +89,10 @@ N_COLOR_BASE = len(CursesColor)
 
 
 def init_colors():
+    """Initialize the color pairs, and returns the table of their attributes.
+
+    The attribute for the pair (fg, bg) is table[fg + 1][bg + 1].
+    """
     curses.use_default_colors()
 
     # Undocumented: -1 refers to default color, assuming use_default_colors has
@@ -93,6 +104,11 @@ def init_colors():
             bg = j - 1
             curses.init_pair(c, fg, bg)
 
+    return [
+        [color_from_pair(i - 1, j - 1) for j in range(N_COLOR_BASE)]
+        for i in range(N_COLOR_BASE)
+    ]
+
 
 def pair_to_index(fg, bg):
     return 1 + (fg + 1) * N_COLOR_BASE + bg + 1
@@ -148,63 +164,84 @@ _CHAR_TO_OPERATOR_CLASS = {
     COMMENT_GLYPH: Comment,
 }
 
+# Same as _CHAR_TO_OPERATOR_CLASS, but indexed by glyph byte
+_OPERATOR_CLASS_TABLE = tuple(_CHAR_TO_OPERATOR_CLASS.get(chr(b)) for b in range(256))
+
 
 def operator_factory(grid, grid_char, x, y):
     """Factory for operators.
 
     Note: it will return None if no Operator class is found.
     """
-    klass = _CHAR_TO_OPERATOR_CLASS.get(grid_char.lower())
+    b = ord(grid_char)
+    if b > 0xFF:
+        return None
+
+    klass = _OPERATOR_CLASS_TABLE[LOWER_CASE_TABLE[b]]
     if klass is not None:
-        return klass(grid, x, y, is_passive=grid_char.isupper())
+        return klass(grid, x, y, is_passive=IS_UPPER_CASE_TABLE[b] == 1)
     else:
         return None
 
 
-def parse_grid(grid):
-    operators = []
-    for y, row in enumerate(grid.iter_rows()):
-        for x, c in enumerate(row):
-            if c != DOT_GLYPH:
-                operator = operator_factory(grid, c, x, y)
-                if operator is not None:
-                    operators.append(operator)
-                else:
-                    logger.debug("No operator found for glyph %r", c)
+# Every glyph which may start an operator, both lower and upper case
+_OPERATOR_GLYPHS = "".join(
+    sorted({c for k in _CHAR_TO_OPERATOR_CLASS for c in (k, k.upper())})
+)
+
 
-    return operators
+def parse_grid(grid):
+    return [
+        grid.intern_operator(x, y, c, operator_factory)
+        for x, y, c in grid.find_glyphs(_OPERATOR_GLYPHS)
+    ]
 
 
 def update_grid(grid, frame):
     grid.reset_for_frame()
 
-    operators = parse_grid(grid)
-    logger.debug("Found %d operators", len(operators))
+    operators = grid.cached_operators(parse_grid)
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Found %d operators", len(operators))
 
+    is_locked = grid.is_locked
     for operator in operators:
-        logger.debug(
-            "Looking at operator %s, pos %d, %d", operator, operator.x, operator.y
-        )
-        if grid.is_locked(operator.x, operator.y):
+        if debug:
             logger.debug(
-                "Position @ %d, %d is locked (would be operator %s)",
-                operator.x,
-                operator.y,
-                operator,
+                "Looking at operator %s, pos %d, %d", operator, operator.x, operator.y
             )
+        if is_locked(operator.x, operator.y):
+            if debug:
+                logger.debug(
+                    "Position @ %d, %d is locked (would be operator %s)",
+                    operator.x,
+                    operator.y,
+                    operator,
+                )
             continue
         if operator.is_passive or operator.has_neighbor(BANG_GLYPH):
             operator.run(frame)
 
 
-def render_grid(window, grid):
-    for i, row in enumerate(grid.iter_rows()):
-        window.move(i, 0)
-        rendered_row = (c if c != DOT_GLYPH else EMPTY_GLYPH for c in row)
-        window.addstr("".join(rendered_row))
-
+def render_grid(window, grid, previous=None):
+    """Render the grid into the given window, and return the rendered rows.
 
-def main(screen, path):
+    If given, previous should be the rows returned by the last call: only
+    the cells which changed since then are drawn again.
+    """
+    rendered = [row.replace(DOT_GLYPH, EMPTY_GLYPH) for row in grid.iter_rows()]
+    for y, row in enumerate(rendered):
+        if previous is None:
+            window.addstr(y, 0, row)
+        elif row != previous[y]:
+            for x, (c, old) in enumerate(zip(row, previous[y])):
+                if c != old:
+                    window.addstr(y, x, c)
+    return rendered
+
+
+def main(screen, path, bpm=None):
     grid = OrcaGrid.from_path(path)
 
     top_x = 20
@@ -215,7 +252,12 @@ def main(screen, path):
     # Must be called before any color setup
     curses.start_color()
 
-    init_colors()
+    colors = init_colors()
+    cursor_attr = (
+        curses.A_REVERSE
+        | curses.A_BOLD
+        | colors[CursesColor.YELLOW + 1][CursesColor.DEFAULT + 1]
+    )
 
     # +1 as a hack to avoid ERR when writing on lower right corner
     window = curses.newwin(grid.rows, grid.cols + 1, top_y, top_x)
@@ -236,12 +278,7 @@ def main(screen, path):
             glyph = g
 
         window.move(cursor.y, cursor.x)
-        window.addch(
-            glyph,
-            curses.A_REVERSE
-            | curses.A_BOLD
-            | color_from_pair(CursesColor.YELLOW, CursesColor.DEFAULT),
-        )
+        window.addch(glyph, cursor_attr)
 
     def render_top_banner():
         screen.addstr(0, 0, f"Frame: {frame}")
@@ -250,43 +287,116 @@ def main(screen, path):
     clear_window()
 
     render_top_banner()
-    screen.refresh()
+    screen.noutrefresh()
 
-    render_grid(window, grid)
+    rendered = render_grid(window, grid)
     draw_cursor(grid, cursor)
 
-    window.refresh()
+    window.noutrefresh()
+    curses.doupdate()
+
+    # Position at which the cursor was last drawn
+    drawn_cursor = cursor.x, cursor.y
+    last_draw = time.monotonic()
+    banner_dirty = grid_dirty = cursor_dirty = False
+
+    if bpm is None:
+        next_tick = None
+    else:
+        # One frame per 16th note
+        tick_period = 60 / bpm / 4
+        next_tick = last_draw + tick_period
+        window.timeout(math.ceil(tick_period * 1000))
+
+    def step():
+        nonlocal frame
+        frame += 1
+        logger.debug("Frame %r", frame)
+        update_grid(grid, frame)
 
     while True:
         k = window.getch()
-        if k == ord(" "):
-            frame += 1
-            logging.debug("Frame %r", frame)
-            update_grid(grid, frame)
-        elif k == curses.KEY_UP:
-            cursor.move_up()
-        elif k == curses.KEY_DOWN:
-            cursor.move_down()
-        elif k == curses.KEY_LEFT:
-            cursor.move_left()
-        elif k == curses.KEY_RIGHT:
-            cursor.move_right()
+
+        if next_tick is not None and time.monotonic() >= next_tick:
+            step()
+            next_tick = max(next_tick + tick_period, time.monotonic())
+            banner_dirty = grid_dirty = True
+
+        if k == -1:
+            # Timeout: woken up to advance or draw pending changes
+            pass
+        elif k == ord(" "):
+            step()
+            banner_dirty = grid_dirty = True
+        elif k in (curses.KEY_UP, curses.KEY_DOWN, curses.KEY_LEFT, curses.KEY_RIGHT):
+            if k == curses.KEY_UP:
+                cursor.move_up()
+            elif k == curses.KEY_DOWN:
+                cursor.move_down()
+            elif k == curses.KEY_LEFT:
+                cursor.move_left()
+            else:
+                cursor.move_right()
+            banner_dirty = cursor_dirty = True
         else:
             grid.poke(cursor.x, cursor.y, chr(k))
+            grid_dirty = True
+
+        # Cap the refresh rate: if we drew too recently, come back once the
+        # frame period is elapsed, unless another key comes first.
+        now = time.monotonic()
+        wake_up = next_tick
+        if banner_dirty or grid_dirty or cursor_dirty:
+            if now < last_draw + FRAME_PERIOD:
+                wake_up = last_draw + FRAME_PERIOD
+                if next_tick is not None:
+                    wake_up = min(wake_up, next_tick)
+            else:
+                if banner_dirty:
+                    render_top_banner()
+                    screen.noutrefresh()
+
+                if grid_dirty or cursor_dirty:
+                    # Restore the cell under the cursor, so that the window
+                    # matches the last rendered rows again
+                    x, y = drawn_cursor
+                    window.addstr(y, x, rendered[y][x])
+
+                    # When only the cursor moved, the grid itself is unchanged
+                    if grid_dirty:
+                        rendered = render_grid(window, grid, rendered)
+                    draw_cursor(grid, cursor)
+                    drawn_cursor = cursor.x, cursor.y
+
+                    window.noutrefresh()
+
+                # Send both the banner and grid changes to the terminal at once
+                curses.doupdate()
+                last_draw = now
+                banner_dirty = grid_dirty = cursor_dirty = False
+
+        if wake_up is None:
+            window.timeout(-1)
+        else:
+            window.timeout(max(0, math.ceil((wake_up - now) * 1000)))
 
-        render_top_banner()
-        screen.refresh()
-
-        clear_window()
-        render_grid(window, grid)
-        draw_cursor(grid, cursor)
 
-        window.refresh()
+def positive_bpm(value):
+    bpm = float(value)
+    if not math.isfinite(bpm) or bpm <= 0:
+        raise argparse.ArgumentTypeError(f"bpm must be a positive number: {value!r}")
+    return bpm
 
 
 def main_cli(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("path", help="Path to .orca file.")
+    p.add_argument(
+        "--bpm",
+        type=positive_bpm,
+        help="Advance one frame per 16th note at the given tempo, instead of "
+        "only on space.",
+    )
 
     ns = p.parse_args(argv)
 
@@ -300,7 +410,7 @@ def main_cli(argv=None):
             with keypad(screen):
                 # Hide cursor
                 curses.curs_set(0)
-                main(screen, ns.path)
+                main(screen, ns.path, ns.bpm)
                 curses.napms(2000)
     finally:
         curses.endwin()
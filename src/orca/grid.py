@@ -1,5 +1,7 @@
 import dataclasses
+import functools
 import pathlib
+import re
 
 
 BANG_GLYPH = "*"
@@ -9,6 +11,17 @@ DOT_GLYPH = "."
 COMMENT_GLYPH = "#"
 EMPTY_GLYPH = " "
 
+DOT_BYTE = ord(DOT_GLYPH)
+BANG_BYTE = ord(BANG_GLYPH)
+COMMENT_BYTE = ord(COMMENT_GLYPH)
+
+# Marker byte for cells holding a non-ASCII glyph
+_WIDE_BYTE = 0x80
+# Byte of the cells bordering the grid, see OrcaGrid.__init__
+BORDER_BYTE = 0xFF
+
+_CACHE_LINE_SIZE = 64
+
 GLYPH_TABLE = [
     "0",
     "1",
@@ -50,6 +63,12 @@ GLYPH_TABLE = [
 GLYPH_TABLE_SIZE = len(GLYPH_TABLE)
 INDEX_TO_GLYPH = {k: i for i, k in enumerate(GLYPH_TABLE)}
 
+# Byte -> byte tables for ASCII case handling, to avoid going through str
+# methods for single glyphs
+LOWER_CASE_TABLE = bytes(range(256)).lower()
+UPPER_CASE_TABLE = bytes(range(256)).upper()
+IS_UPPER_CASE_TABLE = bytes(1 if 0x41 <= b <= 0x5A else 0 for b in range(256))
+
 
 # orca-c has a different version
 def index_of_orca_js(c):
@@ -60,12 +79,99 @@ glyph_table_index_of = index_of_orca_js
 
 
 def glyph_to_value(glyph):
+    # Dots are by far the most common glyph, and None/"" can't go through ord
+    if glyph == DOT_GLYPH or not glyph:
+        return 0
+    elif len(glyph) == 1:
+        b = ord(glyph)
+        if b < 0x80:
+            return _VALUE_TABLE[b]
+    return _glyph_to_value(glyph)
+
+
+# Only reached for non-ASCII or multi character glyphs, cached as those go
+# through str.lower and a dict lookup
+@functools.lru_cache(maxsize=256)
+def _glyph_to_value(glyph):
     if glyph in (DOT_GLYPH, BANG_GLYPH, None, ""):
         return 0
     else:
         return glyph_table_index_of(glyph)
 
 
+# Tables so that glyph <-> value conversions of grid cells are a single
+# lookup: _VALUE_TABLE[b] == glyph_to_value(chr(b)) for ASCII bytes. It covers
+# every byte so that any state byte can index it: border cells are 0, like
+# cells outside the grid, _WIDE_BYTE must be handled before.
+_VALUE_TABLE = tuple(
+    _glyph_to_value.__wrapped__(chr(b)) if b < 0x80 else 0 for b in range(0x100)
+)
+_UPPER_GLYPH_TABLE = [glyph.upper() for glyph in GLYPH_TABLE]
+
+
+@functools.lru_cache(maxsize=None)
+def _glyphs_pattern(glyphs):
+    return re.compile(b"[" + re.escape(glyphs.encode("ascii")) + b"]")
+
+
+def _stride_of(cols):
+    """Returns the state row stride of a grid with the given number of
+    columns, see OrcaGrid.__init__."""
+    stride = cols + 2
+    if stride % _CACHE_LINE_SIZE == 0:
+        # Rows a multiple of the cache line size apart map to the same cache
+        # sets, pad them so that vertical neighbors do not.
+        stride += 1
+    return stride
+
+
+# Grid strings up to this length are cached by _split_grid_string, which bounds
+# the cache to a few hundred KB
+_CACHED_GRID_STRING_LENGTH = 4096
+
+
+def _split_grid_string(s):
+    """Same as _split_grid_string_uncached, caching small grids as the same
+    ones tend to be loaded again and again, e.g. in tests."""
+    if len(s) <= _CACHED_GRID_STRING_LENGTH:
+        return _split_grid_string_cached(s)
+    return _split_grid_string_uncached(s)
+
+
+def _split_grid_string_uncached(s):
+    """Split and check the lines of the given grid string.
+
+    Returns (lines, body), where body is the grid state without its top and
+    bottom border rows for ASCII grids, None otherwise.
+    """
+    is_ascii = s.isascii()
+    # Split the str, as bytes.splitlines does not break on the same characters
+    lines = s.splitlines()
+    if is_ascii:
+        lines = [line.encode("ascii") for line in lines]
+    if len(lines) > 200:
+        raise ValueError(f"String has too many lines ({len(lines)}, max is 200)")
+
+    if len(lines) < 1:
+        raise ValueError(f"Empty string !")
+
+    n = len(lines[0])
+    for i, line in enumerate(lines):
+        if len(line) != n:
+            raise ValueError(f"Line {i} length is inconsistent: {len(line)} vs {n}")
+
+    if is_ascii:
+        border = bytes((BORDER_BYTE,))
+        # Left border, then the right one and the row padding
+        right = border * (_stride_of(n) - n - 1)
+        return tuple(lines), b"".join(border + line + right for line in lines)
+    else:
+        return tuple(lines), None
+
+
+_split_grid_string_cached = functools.lru_cache(maxsize=32)(_split_grid_string_uncached)
+
+
 @dataclasses.dataclass(eq=True, frozen=True)
 class MidiNoteOnEvent:
     channel: int
@@ -96,44 +202,108 @@ class OrcaGrid:
 
     @classmethod
     def from_string(cls, s):
-        lines = s.splitlines()
-        if len(lines) > 200:
-            raise ValueError(f"String has too many lines ({len(lines)}, max is 200)")
-
-        if len(lines) < 1:
-            raise ValueError(f"Empty string !")
-
-        n = len(lines[0])
-        for i, line in enumerate(lines):
-            if len(line) != n:
-                raise ValueError(f"Line {i} length is inconsistent: {len(line)} vs {n}")
-
-        lines = [list(line) for line in lines]
-
+        lines, body = _split_grid_string(s)
         ret = cls(len(lines), len(lines[0]))
-        ret._state = lines
+        if body is not None:
+            # Fast path: ASCII grids are copied as is into the grid state
+            stride = ret._stride
+            ret._state[stride:-stride] = body
+        else:
+            for y, line in enumerate(lines):
+                for x, c in enumerate(line):
+                    ret.poke(x, y, c)
         return ret
 
     def __init__(self, rows, cols):
         self.rows = rows
         self.cols = cols
 
-        # Raw state of the grid at a given state
-        self._state = [[DOT_GLYPH for _ in range(cols)] for _ in range(rows)]
+        # Raw state of the grid at a given state, one byte per cell, row
+        # major. Orca glyphs are ASCII: anything else is stored in _wide, with
+        # a marker byte in _state.
+        #
+        # The grid is surrounded by a one cell border of BORDER_BYTE, so that
+        # the neighbors of any cell can be read without bounds checks: (x, y)
+        # is at index (y + 1) * self._stride + x + 1.
+        self._stride = stride = _stride_of(cols)
+        self._state = bytearray((BORDER_BYTE,)) * ((rows + 2) * stride)
+        for y in range(rows):
+            start = (y + 1) * stride + 1
+            self._state[start : start + cols] = DOT_GLYPH.encode("ascii") * cols
+        self._wide = {}
 
         # Each grid's position may be locked, in which case it should not be
         # processed as an operator. For example, if the right operator of add
         # is itself a letter, you want to make sure you're not considering it
         # as its own operator. Here we rely on orca processing from the left to
         # the right, and from the top to the bottom.
-        self._locks = None
+        self._locks = bytearray(len(self._state))
+        # Kept around so that resetting locks does not allocate anything
+        self._no_locks = bytes(len(self._state))
+        self._locked_row = memoryview(b"\x01" * cols)
 
-        self.reset_locks()
+        # Set whenever a cell changes, to know when operators need to be
+        # parsed again.
+        self._dirty = True
+        self._cached_operators = None
+        # Operators created for a given cell, indexed like _state. Entries are
+        # evicted whenever their cell changes.
+        self._operators = {}
 
-        self._midi_events = set()
+        self._midi_events = []
 
     def iter_rows(self):
-        return iter(self._state)
+        """Iterate over the grid rows, each row being returned as a string."""
+        cols = self.cols
+        if self._wide:
+            return (
+                "".join(self.peek(x, y) for x in range(cols)) for y in range(self.rows)
+            )
+        else:
+            # Decode the whole state at once, slicing a str is cheaper. latin-1
+            # maps the border bytes, which are sliced out anyway.
+            stride = self._stride
+            state = self._state.decode("latin-1")
+            return (
+                state[(y + 1) * stride + 1 : (y + 1) * stride + 1 + cols]
+                for y in range(self.rows)
+            )
+
+    def find_glyphs(self, glyphs):
+        """Iterate over the cells holding any of the given (ASCII) glyphs.
+
+        Yields (x, y, glyph) tuples in row-major order. The scan itself is
+        done by the regex engine, so only matching cells cost python code.
+        """
+        stride = self._stride
+        state = self._state
+        for m in _glyphs_pattern(glyphs).finditer(state):
+            index = m.start()
+            y, x = divmod(index, stride)
+            yield x - 1, y - 1, chr(state[index])
+
+    def cached_operators(self, parse):
+        """Returns the operators of the grid, as returned by parse(grid).
+
+        parse is only called again once a cell of the grid has been changed.
+        """
+        if self._dirty:
+            self._cached_operators = parse(self)
+            self._dirty = False
+        return self._cached_operators
+
+    def intern_operator(self, x, y, glyph, factory):
+        """Returns the operator for the given cell, as built by
+        factory(grid, glyph, x, y).
+
+        The same operator instance is returned as long as the cell does not
+        change.
+        """
+        index = (y + 1) * self._stride + x + 1
+        operator = self._operators.get(index)
+        if operator is None:
+            operator = self._operators[index] = factory(self, glyph, x, y)
+        return operator
 
     def reset_for_frame(self):
         """This method should be called before starting any grid-related
@@ -144,20 +314,44 @@ class OrcaGrid:
 
     # Locking utils
     def lock(self, x, y):
-        self._locks[y][x] = True
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            self._locks[(y + 1) * self._stride + x + 1] = 1
+
+    def lock_range(self, y, start, stop):
+        """Lock the cells of row y with start <= x < stop."""
+        if 0 <= y < self.rows:
+            start = max(start, 0)
+            stop = min(stop, self.cols)
+            if start < stop:
+                offset = (y + 1) * self._stride + 1
+                self._locks[offset + start : offset + stop] = self._locked_row[
+                    : stop - start
+                ]
+
+    def lock_many(self, coords):
+        """Lock every (x, y) position of the given sequence."""
+        cols = self.cols
+        rows = self.rows
+        stride = self._stride
+        locks = self._locks
+        for x, y in coords:
+            if 0 <= x < cols and 0 <= y < rows:
+                locks[(y + 1) * stride + x + 1] = 1
 
     def is_operator_locked(self, operator):
         return self.is_locked(operator.x, operator.y)
 
     def is_locked(self, x, y):
-        return self._locks[y][x]
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self._locks[(y + 1) * self._stride + x + 1] != 0
+        return False
 
     def reset_locks(self):
         """Reset locks.
 
         Every internal lock will be set as unlock.
         """
-        self._locks = [[False for _ in range(self.cols)] for _ in range(self.rows)]
+        self._locks[:] = self._no_locks
 
     # Peek/poke/listen
     def listen(self, port):
@@ -166,11 +360,29 @@ class OrcaGrid:
         This essentially peeks at the given port's position, taking into
         account the port default.
         """
-        g = self.peek(port.x, port.y)
-        if g in (DOT_GLYPH, BANG_GLYPH) and port.default:
-            return port.default
+        x = port.x
+        y = port.y
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            index = (y + 1) * self._stride + x + 1
+            b = self._state[index]
+            if (b == DOT_BYTE or b == BANG_BYTE) and port.default:
+                return port.default
+            elif b == _WIDE_BYTE:
+                return self._wide[index]
+            else:
+                return chr(b)
+        return None
+
+    def _value_at(self, index, port):
+        """Returns the unclamped value of the given port, read in the grid
+        state at index."""
+        b = self._state[index]
+        if b == _WIDE_BYTE:
+            return glyph_to_value(self._wide[index])
+        elif (b == DOT_BYTE or b == BANG_BYTE) and port.default:
+            return port.default_value
         else:
-            return g
+            return _VALUE_TABLE[b]
 
     def listen_as_value(self, port):
         """Listen to the given port's value.
@@ -178,36 +390,188 @@ class OrcaGrid:
         This listen to the port's glyph, and translates it into a numerical
         value, taking into account the port clamp.
         """
-        glyph = self.listen(port)
-        return port.clamp(self.value_of(glyph))
+        x = port.x
+        y = port.y
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            value = self._value_at((y + 1) * self._stride + x + 1, port)
+        else:
+            value = 0
+        return port.clamp(value)
+
+    def listen_values(self, ports):
+        """Listen to the values of all the given ports.
+
+        Returns the same list as [self.listen_as_value(p) for p in ports],
+        without going through listen/peek for each port.
+        """
+        cols = self.cols
+        rows = self.rows
+        stride = self._stride
+        values = []
+        for port in ports:
+            x = port.x
+            y = port.y
+            if 0 <= x < cols and 0 <= y < rows:
+                value = self._value_at((y + 1) * stride + x + 1, port)
+            else:
+                value = 0
+            values.append(port.clamp(value))
+        return values
+
+    def listen_border_values(self, ports):
+        """Same as listen_values, without bounds checks.
+
+        Every port must be inside the grid or its border, i.e. at most one
+        cell away from it. Border cells listen as 0.
+        """
+        stride = self._stride
+        return [
+            port.clamp(self._value_at((port.y + 1) * stride + port.x + 1, port))
+            for port in ports
+        ]
 
     def is_inside(self, x, y):
         """Returns True if the given coordinates are inside the grid boundaries."""
-        return x >= 0 and x < self.cols and y >= 0 and y < self.rows
+        return 0 <= x < self.cols and 0 <= y < self.rows
 
     def peek(self, x, y):
         """Returns the glyph at the given indices.
 
-        Will return empty string if outside the grid boundaries.
+        Will return None if outside the grid boundaries.
         """
-        try:
-            return self._state[y][x]
-        except IndexError:
-            return None
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            index = (y + 1) * self._stride + x + 1
+            b = self._state[index]
+            if b == _WIDE_BYTE:
+                return self._wide[index]
+            return chr(b)
+        return None
 
     def poke(self, x, y, value):
         """Will set the given value at the given position in the grid.
 
         Will do nothing if outside the grid boundaries.
         """
-        try:
-            self._state[y][x] = value
-        except IndexError:
-            pass
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            index = (y + 1) * self._stride + x + 1
+            b = ord(value)
+            if b < _WIDE_BYTE:
+                if self._state[index] != b:
+                    self._state[index] = b
+                    self._changed(index)
+            elif self._wide.get(index) != value:
+                self._state[index] = _WIDE_BYTE
+                self._wide[index] = value
+                self._changed(index)
+
+    def peek_byte(self, x, y):
+        """Same as peek, but returns the glyph byte.
+
+        Non-ASCII glyphs are all returned as the same byte, which is not an
+        ASCII one.
+        """
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self._state[(y + 1) * self._stride + x + 1]
+        return None
+
+    def peek_border_byte(self, x, y):
+        """Same as peek_byte, without bounds check.
+
+        (x, y) must be inside the grid or its border, i.e. at most one cell
+        away from it. Border cells are returned as BORDER_BYTE.
+        """
+        return self._state[(y + 1) * self._stride + x + 1]
+
+    def find_byte(self, b, x, y):
+        """Returns the x of the first cell of row y, at or after x, holding b.
+
+        Returns None if there is no such cell.
+        """
+        offset = (y + 1) * self._stride + 1
+        index = self._state.find(b, offset + max(x, 0), offset + self.cols)
+        if index < 0:
+            return None
+        return index - offset
+
+    def peek_bytes(self, coords):
+        """Returns [self.peek_byte(x, y) for x, y in coords]."""
+        cols = self.cols
+        rows = self.rows
+        stride = self._stride
+        state = self._state
+        return [
+            state[(y + 1) * stride + x + 1] if 0 <= x < cols and 0 <= y < rows else None
+            for x, y in coords
+        ]
+
+    def neighbor_bytes(self, x, y):
+        """Returns the bytes of the left, right, top and bottom neighbors of
+        the given cell.
+
+        No bounds check is done: (x, y) must be inside the grid. Neighbors
+        outside the grid are returned as BORDER_BYTE.
+        """
+        stride = self._stride
+        state = self._state
+        index = (y + 1) * stride + x + 1
+        return (
+            state[index - 1],
+            state[index + 1],
+            state[index - stride],
+            state[index + stride],
+        )
+
+    def poke_byte(self, x, y, b):
+        """Same as poke, for the given ASCII glyph byte."""
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            index = (y + 1) * self._stride + x + 1
+            if self._state[index] != b:
+                self._state[index] = b
+                self._changed(index)
+
+    def copy_span(self, src_x, src_y, dst_x, dst_y, length):
+        """Copy length cells of row src_y, starting at src_x, into row dst_y,
+        starting at dst_x.
+
+        Same as poking each destination cell with the glyph peeked at the
+        matching source cell, in order, skipping the cells where either is
+        outside the grid. Within the same row, an overlapping destination
+        thus picks up cells already copied.
+        """
+        if not (0 <= src_y < self.rows and 0 <= dst_y < self.rows):
+            return
+        cols = self.cols
+        start = max(0, -src_x, -dst_x)
+        stop = min(length, cols - src_x, cols - dst_x)
+        if start >= stop:
+            return
+
+        if self._wide or src_y == dst_y:
+            for offset in range(start, stop):
+                self.poke(dst_x + offset, dst_y, self.peek(src_x + offset, src_y))
+            return
+
+        stride = self._stride
+        state = self._state
+        src = (src_y + 1) * stride + src_x + 1
+        dst = (dst_y + 1) * stride + dst_x + 1
+        values = state[src + start : src + stop]
+        previous = state[dst + start : dst + stop]
+        if values != previous:
+            state[dst + start : dst + stop] = values
+            for index, b, old in zip(range(dst + start, dst + stop), values, previous):
+                if b != old:
+                    self._changed(index)
+
+    def _changed(self, index):
+        self._dirty = True
+        self._operators.pop(index, None)
+        if self._wide and self._state[index] != _WIDE_BYTE:
+            self._wide.pop(index, None)
 
     # Midi IO
     def push_midi(self, event):
-        self._midi_events.add(event)
+        self._midi_events.append(event)
 
     # Orca-compat 'layer', to help porting from orca nodejs code.
     def glyph_at(self, x, y):
@@ -215,13 +579,17 @@ class OrcaGrid:
 
     def key_of(self, index, upper_case=False):
         """ Returns the glyph from the given table index."""
-        glyph = GLYPH_TABLE[index % GLYPH_TABLE_SIZE]
         if upper_case:
-            return glyph.upper()
+            return _UPPER_GLYPH_TABLE[index % GLYPH_TABLE_SIZE]
         else:
-            return glyph
+            return GLYPH_TABLE[index % GLYPH_TABLE_SIZE]
 
     def value_at(self, x, y):
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            index = (y + 1) * self._stride + x + 1
+            b = self._state[index]
+            if b != _WIDE_BYTE:
+                return _VALUE_TABLE[b]
         return glyph_to_value(self.peek(x, y))
 
     def value_of(self, g):
@@ -1,9 +1,22 @@
 import abc
+import linecache
 import logging
-import math
 import random
 
-from orca.grid import BANG_GLYPH, COMMENT_GLYPH, DOT_GLYPH, MidiNoteOnEvent
+from orca.grid import (
+    BANG_BYTE,
+    BANG_GLYPH,
+    BORDER_BYTE,
+    COMMENT_BYTE,
+    COMMENT_GLYPH,
+    DOT_BYTE,
+    DOT_GLYPH,
+    GLYPH_TABLE,
+    GLYPH_TABLE_SIZE,
+    IS_UPPER_CASE_TABLE,
+    UPPER_CASE_TABLE,
+    MidiNoteOnEvent,
+)
 from orca.ports import InputPort, OutputPort
 
 
@@ -13,6 +26,21 @@ OUTPUT_PORT_NAME = "output"
 
 
 class IOperator(abc.ABC):
+    __slots__ = (
+        "x",
+        "y",
+        "name",
+        "description",
+        "ports",
+        "_output_port",
+        "_lock_coords",
+        "_upper_probe_port",
+        "_grid",
+        "is_passive",
+        "do_draw",
+        "glyph",
+    )
+
     def __init__(
         self, grid, x, y, name, description, *, glyph=DOT_GLYPH, is_passive=False
     ):
@@ -23,6 +51,12 @@ class IOperator(abc.ABC):
         self.description = description
 
         self.ports = {}
+        # Derived from ports, see _rebuild_port_cache
+        self._output_port = None
+        self._lock_coords = ()
+
+        # Port whose glyph decides whether the output should be upper case
+        self._upper_probe_port = InputPort(x + 1, y)
 
         self._grid = grid
 
@@ -46,18 +80,15 @@ class IOperator(abc.ABC):
     def run(self, frame, force=False):
         payload = self.operation(frame, force)
 
-        for port in self.ports.values():
-            if isinstance(port, OutputPort) and port.is_bang:
-                continue
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug(
-                "Ops %s (%d, %d): locking port @ %d, %d",
+                "Ops %s (%d, %d): locking ports @ %s",
                 self.name,
                 self.x,
                 self.y,
-                port.x,
-                port.y,
+                self._lock_coords,
             )
-            self._grid.lock(port.x, port.y)
+        self._grid.lock_many(self._lock_coords)
 
         output_port = self._output_port
         if output_port:
@@ -67,26 +98,32 @@ class IOperator(abc.ABC):
                 self._output(payload)
 
     def erase(self):
-        self._grid.poke(self.x, self.y, DOT_GLYPH)
+        self._grid.poke_byte(self.x, self.y, DOT_BYTE)
 
     def explode(self):
-        self._grid.poke(self.x, self.y, BANG_GLYPH)
+        self._grid.poke_byte(self.x, self.y, BANG_BYTE)
 
     def has_neighbor(self, glyph):
-        for x, y in ((-1, 0), (1, 0), (0, -1), (0, 1)):
-            if self._grid.peek(self.x + x, self.y + y) == glyph:
-                return True
-        return False
+        # Compare bytes, unless the glyph is not ASCII
+        target = ord(glyph)
+        if target < 0x80:
+            return target in self._grid.neighbor_bytes(self.x, self.y)
+        else:
+            x = self.x
+            y = self.y
+            neighbors = ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1))
+            return any(self._grid.peek(nx, ny) == glyph for nx, ny in neighbors)
 
     def move(self, offset_x, offset_y):
         new_x = self.x + offset_x
         new_y = self.y + offset_y
-        if not self._grid.is_inside(new_x, new_y):
-            self.explode()
-            return
-
-        collider = self._grid.peek(new_x, new_y)
-        if collider not in (BANG_GLYPH, DOT_GLYPH):
+        if -1 <= offset_x <= 1 and -1 <= offset_y <= 1:
+            # At worst this reads the border, which explodes as well
+            collider = self._grid.peek_border_byte(new_x, new_y)
+        else:
+            # None when outside the grid, which explodes as well
+            collider = self._grid.peek_byte(new_x, new_y)
+        if collider != DOT_BYTE and collider != BANG_BYTE:
             self.explode()
             return
 
@@ -94,32 +131,49 @@ class IOperator(abc.ABC):
         self.x += offset_x
         self.y += offset_y
         self._grid.poke(self.x, self.y, self.glyph)
-        if self._grid.is_inside(self.x, self.y):
-            self._grid.lock(self.x, self.y)
+        self._grid.lock(self.x, self.y)
+
+    def _update_ports(self, ports):
+        """Add the given ports to the operator.
 
-    @property
-    def _output_port(self):
-        return self.ports.get(OUTPUT_PORT_NAME)
+        Port lookups done every frame are cached here, see
+        _rebuild_port_cache.
+        """
+        self.ports.update(ports)
+        self._rebuild_port_cache()
 
-    def _has_output_port(self):
-        return OUTPUT_PORT_NAME in self.ports
+    def _rebuild_port_cache(self):
+        """Update the port lookups cached from self.ports.
+
+        Must be called whenever self.ports is modified.
+        """
+        self._output_port = self.ports.get(OUTPUT_PORT_NAME)
+        # Positions locked after each run: bang outputs are not locked
+        self._lock_coords = tuple(
+            (port.x, port.y)
+            for port in self.ports.values()
+            if not (isinstance(port, OutputPort) and port.is_bang)
+        )
 
     def _should_upper_case(self):
         output_port = self._output_port
         if output_port is None or not output_port.is_sensitive:
             return False
         else:
-            right_port = InputPort(self.x + 1, self.y)
-            value = self._grid.listen(right_port)
-            if value.lower() == value.upper() or value.upper() != value:
+            # The probe is right of the operator, so at worst on the border
+            probe = self._upper_probe_port
+            b = self._grid.peek_border_byte(probe.x, probe.y)
+            if b < 0x80:
+                return IS_UPPER_CASE_TABLE[b] == 1
+            elif b == BORDER_BYTE:
                 return False
             else:
-                return True
+                return self._grid.listen(probe).isupper()
 
     def _bang(self, payload):
         output_port = self._output_port
         if output_port is None:
-            logger.warn("Trying to bang, but no output port.")
+            logger.warning("Trying to bang, but no output port.")
             return
         else:
             glyph = BANG_GLYPH if payload else DOT_GLYPH
@@ -132,26 +186,82 @@ class IOperator(abc.ABC):
             output_port = port
 
         if output_port is None:
-            logging.warn(
+            logger.warning(
                 "No output port for operator %s @ (%d, %d)", self.name, self.x, self.y
             )
         elif glyph is None:
             return
         else:
-            if self._should_upper_case():
-                value = glyph.upper()
+            b = ord(glyph)
+            if b < 0x80:
+                if self._should_upper_case():
+                    b = UPPER_CASE_TABLE[b]
+                self._grid.poke_byte(output_port.x, output_port.y, b)
             else:
-                value = glyph
-            self._grid.poke(output_port.x, output_port.y, value)
-
+                if self._should_upper_case():
+                    value = glyph.upper()
+                else:
+                    value = glyph
+                self._grid.poke(output_port.x, output_port.y, value)
+
+
+def _compile_operation(inputs, expr):
+    """Generate an operation returning the key of expr.
+
+    expr is evaluated with frame and the values of the given input ports, read
+    in a single grid call. The key is looked up in GLYPH_TABLE directly, as
+    OrcaGrid.key_of would. The source is registered in linecache so that
+    tracebacks show it.
+    """
+    source = (
+        "def operation(self, frame, force=False):\n"
+        f"    {', '.join(inputs)}, = "
+        "self._grid.listen_border_values(self._value_ports)\n"
+        f"    return GLYPH_TABLE[({expr}) % GLYPH_TABLE_SIZE]\n"
+    )
+    filename = f"<operation: {expr}>"
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    namespace = {
+        "GLYPH_TABLE": GLYPH_TABLE,
+        "GLYPH_TABLE_SIZE": GLYPH_TABLE_SIZE,
+        "random": random,
+    }
+    exec(compile(source, filename, "exec"), namespace)
+    return namespace["operation"]
+
+
+class _ArithmeticOperator(IOperator):
+    """Operator outputting the key of a fixed expression of its inputs.
+
+    Subclasses are declared with the names of the input ports and the
+    expression, e.g. `class Add(_ArithmeticOperator, inputs=("a", "b"),
+    expr="a + b")`. The operation is generated at class creation time.
+
+    The input ports must be next to the operator, as they are read without
+    bounds checks.
+    """
+
+    __slots__ = ("_value_ports",)
+
+    def __init_subclass__(cls, *, inputs, expr, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._value_port_names = inputs
+        cls.operation = _compile_operation(inputs, expr)
+
+    def _update_ports(self, ports):
+        super()._update_ports(ports)
+        self._value_ports = tuple(self.ports[name] for name in self._value_port_names)
+
+
+class Add(_ArithmeticOperator, inputs=("a", "b"), expr="a + b"):
+    __slots__ = ()
 
-class Add(IOperator):
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid, x, y, "add", "Output sum of inputs", glyph="a", is_passive=is_passive
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "a": InputPort(x - 1, y),
                 "b": InputPort(x + 1, y),
@@ -159,14 +269,10 @@ class Add(IOperator):
             }
         )
 
-    def operation(self, frame, force=False):
-        index = self._grid.listen_as_value(
-            self.ports["a"]
-        ) + self._grid.listen_as_value(self.ports["b"])
-        return self._grid.key_of(index)
 
+class Substract(_ArithmeticOperator, inputs=("a", "b"), expr="abs(b - a)"):
+    __slots__ = ()
 
-class Substract(IOperator):
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -178,7 +284,7 @@ class Substract(IOperator):
             is_passive=is_passive,
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "a": InputPort(x - 1, y),
                 "b": InputPort(x + 1, y),
@@ -186,13 +292,10 @@ class Substract(IOperator):
             }
         )
 
-    def operation(self, frame, force=False):
-        a = self._grid.listen_as_value(self.ports["a"])
-        b = self._grid.listen_as_value(self.ports["b"])
-        return self._grid.key_of(abs(b - a))
 
+class Clock(_ArithmeticOperator, inputs=("rate", "mod"), expr="(frame // rate) % mod"):
+    __slots__ = ()
 
-class Clock(IOperator):
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -204,7 +307,7 @@ class Clock(IOperator):
             is_passive=is_passive,
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "rate": InputPort(x - 1, y, clamp=lambda x: max(1, x)),
                 "mod": InputPort(x + 1, y, default="8"),
@@ -212,15 +315,10 @@ class Clock(IOperator):
             }
         )
 
-    def operation(self, frame, force=False):
-        rate = self._grid.listen_as_value(self.ports["rate"])
-        mod = self._grid.listen_as_value(self.ports["mod"])
-
-        value = math.floor(frame / rate) % mod
-        return self._grid.key_of(value)
-
 
 class Delay(IOperator):
+    __slots__ = ("_value_ports",)
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -232,23 +330,25 @@ class Delay(IOperator):
             is_passive=is_passive,
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "rate": InputPort(x - 1, y, clamp=lambda x: max(1, x)),
                 "mod": InputPort(x + 1, y, default="8"),
                 OUTPUT_PORT_NAME: OutputPort(x, y + 1, is_bang=True),
             }
         )
+        self._value_ports = (self.ports["rate"], self.ports["mod"])
 
     def operation(self, frame, force=False):
-        rate = self._grid.listen_as_value(self.ports["rate"])
-        mod = self._grid.listen_as_value(self.ports["mod"])
+        rate, mod = self._grid.listen_values(self._value_ports)
 
         value = frame % (mod * rate)
         return value == 0 or mod == 1
 
 
 class East(IOperator):
+    __slots__ = ()
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -267,6 +367,8 @@ class East(IOperator):
 
 
 class Generator(IOperator):
+    __slots__ = ("_value_ports",)
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -277,33 +379,29 @@ class Generator(IOperator):
             glyph="g",
             is_passive=is_passive,
         )
-        self.ports.update(
+        self._update_ports(
             {
                 "x": InputPort(x - 3, y),
                 "y": InputPort(x - 2, y),
                 "len": InputPort(x - 1, y, clamp=lambda x: max(x, 1)),
             }
         )
+        self._value_ports = (self.ports["len"], self.ports["x"], self.ports["y"])
 
     def operation(self, frame, force=False):
-        length = self._grid.listen_as_value(self.ports["len"])
-        x = self._grid.listen_as_value(self.ports["x"])
-        y = self._grid.listen_as_value(self.ports["y"]) + 1
-
-        for offset in range(length):
-            input_port = InputPort(self.x + offset + 1, self.y)
-            output_port = OutputPort(self.x + x + offset, self.y + y)
-            self.ports.update(
-                {
-                    f"input{offset}": input_port,
-                    f"output{offset}": output_port,
-                }
-            )
-            res = self._grid.listen(input_port)
-            self._output(res, output_port)
+        length, x, y = self._grid.listen_values(self._value_ports)
+        y += 1
+
+        # The operands and their copies move with the inputs, so they are not
+        # part of self.ports: they are locked here instead of by run()
+        self._grid.lock_range(self.y, self.x + 1, self.x + 1 + length)
+        self._grid.lock_range(self.y + y, self.x + x, self.x + x + length)
+        self._grid.copy_span(self.x + 1, self.y, self.x + x, self.y + y, length)
 
 
 class Halt(IOperator):
+    __slots__ = ()
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -320,6 +418,8 @@ class Halt(IOperator):
 
 
 class If(IOperator):
+    __slots__ = ("_a_port", "_b_port")
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -331,21 +431,29 @@ class If(IOperator):
             is_passive=is_passive,
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "a": InputPort(x - 1, y),
                 "b": InputPort(x + 1, y),
                 OUTPUT_PORT_NAME: OutputPort(x, y + 1, is_bang=True),
             }
         )
+        self._a_port = self.ports["a"]
+        self._b_port = self.ports["b"]
 
     def operation(self, frame, force=False):
-        a = self._grid.listen(self.ports["a"])
-        b = self._grid.listen(self.ports["b"])
+        a = self._grid.listen(self._a_port)
+        b = self._grid.listen(self._b_port)
         return a == b
 
 
-class Increment(IOperator):
+class Increment(
+    _ArithmeticOperator,
+    inputs=("step", "mod", OUTPUT_PORT_NAME),
+    expr="(output + step) % (mod if mod > 0 else 36)",
+):
+    __slots__ = ()
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -356,7 +464,7 @@ class Increment(IOperator):
             glyph="i",
             is_passive=is_passive,
         )
-        self.ports.update(
+        self._update_ports(
             {
                 "step": InputPort(x - 1, y, default="1"),
                 "mod": InputPort(x + 1, y),
@@ -364,14 +472,10 @@ class Increment(IOperator):
             }
         )
 
-    def operation(self, frame, force=False):
-        step = self._grid.listen_as_value(self.ports["step"])
-        mod = self._grid.listen_as_value(self.ports["mod"])
-        out = self._grid.listen_as_value(self.ports[OUTPUT_PORT_NAME])
-        return self._grid.key_of((out + step) % (mod if mod > 0 else 36))
-
 
 class Jumper(IOperator):
+    __slots__ = ("_val_port",)
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -383,19 +487,22 @@ class Jumper(IOperator):
             is_passive=is_passive,
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "val": InputPort(x, y - 1),
                 OUTPUT_PORT_NAME: OutputPort(x, y + 1),
             }
         )
+        self._val_port = self.ports["val"]
 
     def operation(self, frame, force=False):
         self._grid.lock(self._output_port.x, self._output_port.y)
-        return self._grid.listen(self.ports["val"])
+        return self._grid.listen(self._val_port)
+
 
+class Multiply(_ArithmeticOperator, inputs=("a", "b"), expr="a * b"):
+    __slots__ = ()
 
-class Multiply(IOperator):
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -407,7 +514,7 @@ class Multiply(IOperator):
             is_passive=is_passive,
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "a": InputPort(x - 1, y),
                 "b": InputPort(x + 1, y),
@@ -415,13 +522,10 @@ class Multiply(IOperator):
             }
         )
 
-    def operation(self, frame, force=False):
-        a = self._grid.listen_as_value(self.ports["a"])
-        b = self._grid.listen_as_value(self.ports["b"])
-        return self._grid.key_of(a * b)
-
 
 class North(IOperator):
+    __slots__ = ()
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -439,7 +543,11 @@ class North(IOperator):
         self.is_passive = False
 
 
-class Random(IOperator):
+class Random(
+    _ArithmeticOperator, inputs=("min", "max"), expr="random.randrange(min, max + 1)"
+):
+    __slots__ = ()
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -451,7 +559,7 @@ class Random(IOperator):
             is_passive=is_passive,
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "min": InputPort(x - 1, y),
                 "max": InputPort(x + 1, y),
@@ -459,15 +567,10 @@ class Random(IOperator):
             }
         )
 
-    def operation(self, frame, force=False):
-        low = self._grid.listen_as_value(self.ports["min"])
-        high = self._grid.listen_as_value(self.ports["max"])
-
-        value = random.randint(low, high)
-        return self._grid.key_of(value)
-
 
 class South(IOperator):
+    __slots__ = ()
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -486,6 +589,8 @@ class South(IOperator):
 
 
 class Track(IOperator):
+    __slots__ = ("_value_ports",)
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -496,26 +601,27 @@ class Track(IOperator):
             glyph="t",
             is_passive=is_passive,
         )
-        self.ports.update(
+        self._update_ports(
             {
                 "key": InputPort(x - 2, y),
                 "len": InputPort(x - 1, y, clamp=lambda x: max(1, x)),
                 OUTPUT_PORT_NAME: OutputPort(x, y + 1),
             }
         )
+        self._value_ports = (self.ports["key"], self.ports["len"])
 
     def operation(self, frame, force=False):
-        key = self._grid.listen_as_value(self.ports["key"])
-        length = self._grid.listen_as_value(self.ports["len"])
+        key, length = self._grid.listen_values(self._value_ports)
 
-        for offset in range(length):
-            self._grid.lock(self.x + offset + 1, self.y)
+        self._grid.lock_range(self.y, self.x + 1, self.x + 1 + length)
 
-        port = InputPort(self.x + 1 + key % length, self.y)
-        return self._grid.listen(port)
+        # Same as listening to a port without default
+        return self._grid.peek(self.x + 1 + key % length, self.y)
 
 
 class West(IOperator):
+    __slots__ = ()
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -534,6 +640,8 @@ class West(IOperator):
 
 
 class Jymper(IOperator):
+    __slots__ = ("_val_port",)
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -545,19 +653,22 @@ class Jymper(IOperator):
             is_passive=is_passive,
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "val": InputPort(x - 1, y),
                 OUTPUT_PORT_NAME: OutputPort(x + 1, y),
             }
         )
+        self._val_port = self.ports["val"]
 
     def operation(self, frame, force=False):
         self._grid.lock(self._output_port.x, self._output_port.y)
-        return self._grid.listen(self.ports["val"])
+        return self._grid.listen(self._val_port)
 
 
 class Bang(IOperator):
+    __slots__ = ()
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -576,6 +687,8 @@ class Bang(IOperator):
 
 
 class Comment(IOperator):
+    __slots__ = ()
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -589,11 +702,11 @@ class Comment(IOperator):
         self.do_draw = False
 
     def operation(self, frame, force=False):
-        self._grid.lock(self.x, self.y)
-        for x in range(self.x + 1, self._grid.cols):
-            self._grid.lock(x, self.y)
-            if self._grid.peek(x, self.y) == self.glyph:
-                break
+        # Lock up to and including the closing comment, or the end of the row
+        end = self._grid.find_byte(COMMENT_BYTE, self.x + 1, self.y)
+        if end is None:
+            end = self._grid.cols - 1
+        self._grid.lock_range(self.y, self.x, end + 1)
 
 
 _NOTES_VALUES = ("C", "c", "D", "d", "E", "F", "f", "G", "g", "A", "a", "B")
@@ -601,6 +714,8 @@ NOTE_TO_INDEX = {k: i for i, k in enumerate(_NOTES_VALUES)}
 
 
 class Midi(IOperator):
+    __slots__ = ("_required_coords", "_note_port", "_value_ports")
+
     def __init__(self, grid, x, y, *, is_passive=False):
         super().__init__(
             grid,
@@ -612,7 +727,7 @@ class Midi(IOperator):
             is_passive=True,
         )
 
-        self.ports.update(
+        self._update_ports(
             {
                 "channel": InputPort(self.x + 1, self.y),
                 "octave": InputPort(
@@ -628,23 +743,30 @@ class Midi(IOperator):
             }
         )
 
+        # Midi never moves, so the positions it reads every frame are fixed
+        self._required_coords = tuple(
+            (self.ports[name].x, self.ports[name].y)
+            for name in ("channel", "octave", "note")
+        )
+        self._note_port = self.ports["note"]
+        self._value_ports = tuple(
+            self.ports[name] for name in ("channel", "octave", "velocity", "length")
+        )
+
     def operation(self, frame, force=False):
-        if not self.has_neighbor(BANG_GLYPH) and not force:
+        grid = self._grid
+        if not force and BANG_BYTE not in grid.neighbor_bytes(self.x, self.y):
             return
 
-        for port_name in "channel", "octave", "note":
-            if self._grid.listen(self.ports[port_name]) == DOT_GLYPH:
-                return
+        if DOT_BYTE in grid.peek_bytes(self._required_coords):
+            return
 
-        note = self._grid.listen(self.ports["note"])
-        if not NOTE_TO_INDEX:
+        note = grid.listen(self._note_port)
+        if note not in NOTE_TO_INDEX:
             return
 
-        channel = self._grid.listen_as_value(self.ports["channel"])
+        channel, octave, velocity, length = grid.listen_values(self._value_ports)
         if channel > 15:
             return
-        octave = self._grid.listen_as_value(self.ports["octave"])
-        velocity = self._grid.listen_as_value(self.ports["velocity"])
-        length = self._grid.listen_as_value(self.ports["length"])
 
-        self._grid.push_midi(MidiNoteOnEvent(channel, octave, note, velocity, length))
+        grid.push_midi(MidiNoteOnEvent(channel, octave, note, velocity, length))
@@ -1,3 +1,6 @@
+from orca.grid import glyph_to_value
+
+
 def default_clamp(v):
     return v
 
@@ -5,19 +8,25 @@ def default_clamp(v):
 # Ports represent input/output on the grid. Port instances encompass some of
 # the details about how to interpret the given value in the grid.
 class IPort:
+    __slots__ = ("x", "y", "clamp", "default", "default_value")
+
     def __init__(self, x, y, *, clamp=None, default=None):
         self.x = x
         self.y = y
 
         self.clamp = clamp or default_clamp
         self.default = default
+        # Value of the default glyph, so that listening does not convert it
+        self.default_value = glyph_to_value(default)
 
 
 class InputPort(IPort):
-    pass
+    __slots__ = ()
 
 
 class OutputPort(IPort):
+    __slots__ = ("is_sensitive", "is_bang")
+
     def __init__(
         self, x, y, *, clamp=None, default=None, is_sensitive=False, is_bang=False
     ):
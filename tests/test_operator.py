@@ -1,15 +1,18 @@
 import math
 import unittest
 
-from orca.grid import OrcaGrid
+from orca.grid import MidiNoteOnEvent, OrcaGrid
 from orca.operators import (
     IOperator,
     Add,
     Clock,
+    Comment,
     Generator,
     Increment,
+    Midi,
     Multiply,
     Substract,
+    Track,
 )
 
 
@@ -49,6 +52,17 @@ class TestBaseOperator(unittest.TestCase):
         # Then
         assert grid.peek(offset_x, offset_y) == new_glyph
 
+    def test_slots(self):
+        # Given
+        grid = O("1a2\n...\n...")
+
+        # When
+        ops = [Add(grid, 1, 0), Generator(grid, 1, 0), Midi(grid, 1, 0)]
+
+        # Then
+        for op in ops:
+            assert not hasattr(op, "__dict__")
+
 
 class TestAddOperator(unittest.TestCase):
     def test_operation(self):
@@ -93,6 +107,40 @@ class TestAddOperator(unittest.TestCase):
         assert payload == "c"
 
 
+class TestOperatorUpperCase(unittest.TestCase):
+    def test_output_upper_case(self):
+        # Given
+        grid = O("1AB\n...")
+        add = Add(grid, 1, 0)
+
+        # When
+        add.run(0)
+
+        # Then
+        assert grid.peek(1, 1) == "C"
+
+        # Given
+        grid = O("1Ab\n...")
+        add = Add(grid, 1, 0)
+
+        # When
+        add.run(0)
+
+        # Then
+        assert grid.peek(1, 1) == "c"
+
+        # Given
+        # nothing east of the operator
+        grid = O("1A\n..")
+        add = Add(grid, 1, 0)
+
+        # When
+        add.run(0)
+
+        # Then
+        assert grid.peek(1, 1) == "1"
+
+
 class TestSubstractOperator(unittest.TestCase):
     def test_operation(self):
         # Given
@@ -174,6 +222,46 @@ class TestGeneratorOperator(unittest.TestCase):
         # then
         assert grid.peek(3, 2) == "E"
 
+        # given
+        # y is worth -1, so the output lands in the same row as the input
+        grid = O("2=3G123.....")
+        gen = Generator(grid, 3, 0)
+
+        # when
+        gen.operation(0)
+
+        # then
+        assert list(grid.iter_rows()) == ["2=3G1111...."]
+
+    def test_run_locks_offset_ports(self):
+        # given
+        grid = O("..2GEF\n......\n......")
+        gen = Generator(grid, 3, 0)
+        ports = dict(gen.ports)
+
+        # when
+        gen.run(0)
+
+        # then
+        assert gen.ports == ports
+        assert grid.peek(3, 1) == "E"
+        assert grid.peek(4, 1) == "F"
+        for x, y in ((4, 0), (5, 0), (3, 1), (4, 1)):
+            assert grid.is_locked(x, y)
+
+        # given
+        grid.reset_locks()
+        grid.poke(2, 0, "1")
+
+        # when
+        gen.run(1)
+
+        # then
+        assert gen.ports == ports
+        assert grid.is_locked(3, 1)
+        assert not grid.is_locked(4, 1)
+        assert not grid.is_locked(5, 0)
+
 
 class TestIncrementOperator(unittest.TestCase):
     def test_operation(self):
@@ -239,3 +327,122 @@ class TestMultiplyOperator(unittest.TestCase):
 
         # Then
         assert payload == "k"
+
+
+def _locked_columns(grid, y):
+    return [x for x in range(grid.cols) if grid.is_locked(x, y)]
+
+
+class TestCommentOperator(unittest.TestCase):
+    def test_operation(self):
+        # Given
+        grid = O("a#bc#d..\n........")
+        comment = Comment(grid, 1, 0)
+
+        # When
+        comment.operation(0)
+
+        # Then
+        # up to and including the closing comment
+        assert _locked_columns(grid, 0) == [1, 2, 3, 4]
+        assert _locked_columns(grid, 1) == []
+
+        # Given
+        # no closing comment
+        grid = O("a#bcd\n.....")
+        comment = Comment(grid, 1, 0)
+
+        # When
+        comment.operation(0)
+
+        # Then
+        assert _locked_columns(grid, 0) == [1, 2, 3, 4]
+
+        # Given
+        # comment in the last column
+        grid = O("ab#\n...")
+        comment = Comment(grid, 2, 0)
+
+        # When
+        comment.operation(0)
+
+        # Then
+        assert _locked_columns(grid, 0) == [2]
+
+
+class TestTrackOperator(unittest.TestCase):
+    def test_operation(self):
+        # Given
+        grid = O("23Tabcd.\n........")
+        track = Track(grid, 2, 0)
+
+        # When
+        payload = track.operation(0)
+
+        # Then
+        assert payload == "c"
+        assert _locked_columns(grid, 0) == [3, 4, 5]
+        assert _locked_columns(grid, 1) == []
+
+        # Given
+        # span clipped at the row end
+        grid = O("15Tab\n.....")
+        track = Track(grid, 2, 0)
+
+        # When
+        payload = track.operation(0)
+
+        # Then
+        assert payload == "b"
+        assert _locked_columns(grid, 0) == [3, 4]
+
+
+class TestMidiOperator(unittest.TestCase):
+    def test_operation(self):
+        # Given
+        grid = O(":03C..\n*.....")
+        midi = Midi(grid, 0, 0)
+
+        # When
+        midi.operation(0)
+
+        # Then
+        assert grid._midi_events == [MidiNoteOnEvent(0, 3, "C", 15, 0)]
+
+        # Given
+        grid = O(":03x..\n*.....")
+        midi = Midi(grid, 0, 0)
+
+        # When
+        midi.operation(0)
+
+        # Then
+        assert grid._midi_events == []
+
+        # Given
+        # no neighboring bang
+        grid = O(":03C..\n......")
+        midi = Midi(grid, 0, 0)
+
+        # When
+        midi.operation(0)
+
+        # Then
+        assert grid._midi_events == []
+
+        # When
+        midi.operation(0, force=True)
+
+        # Then
+        assert grid._midi_events == [MidiNoteOnEvent(0, 3, "C", 15, 0)]
+
+        # Given
+        # missing octave
+        grid = O(":0.C..\n*.....")
+        midi = Midi(grid, 0, 0)
+
+        # When
+        midi.operation(0)
+
+        # Then
+        assert grid._midi_events == []
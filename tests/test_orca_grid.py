@@ -1,9 +1,11 @@
 import unittest
 
+import pytest
 from hypothesis import given
 from hypothesis.strategies import characters, sampled_from
 
 from orca.grid import (
+    BORDER_BYTE,
     GLYPH_TABLE,
     DOT_GLYPH,
     BANG_GLYPH,
@@ -69,6 +71,57 @@ def test_create_grid_from_string_simple():
     assert grid.cols == 3
 
 
+def test_create_grid_from_string_twice():
+    # Given
+    s = ".A.\n..."
+    grid = OrcaGrid.from_string(s)
+
+    # When
+    grid.poke(0, 0, "b")
+    other = OrcaGrid.from_string(s)
+
+    # Then
+    assert list(other.iter_rows()) == [".A.", "..."]
+    assert list(grid.iter_rows()) == ["bA.", "..."]
+
+
+def test_create_grid_from_string_inconsistent():
+    # Given
+    # form feed is a line boundary for str.splitlines
+    s = "ab\x0ccd\nefghi"
+
+    # When/Then
+    with pytest.raises(ValueError):
+        OrcaGrid.from_string(s)
+
+
+def test_create_grid_from_string_non_ascii():
+    # Given
+    s = ".本.\n..."
+
+    # When
+    grid = OrcaGrid.from_string(s)
+
+    # Then
+    assert grid.rows == 2
+    assert grid.cols == 3
+    assert grid.peek(1, 0) == "本"
+
+
+def test_create_grid_from_string_padded_rows():
+    # Given
+    # rows are padded when 62 + 2 border cells would be a cache line
+    s = "\n".join(["." * 61 + "a", "." * 61 + "b"])
+
+    # When
+    grid = OrcaGrid.from_string(s)
+
+    # Then
+    assert list(grid.iter_rows()) == s.splitlines()
+    assert list(grid.find_glyphs("ab")) == [(61, 0, "a"), (61, 1, "b")]
+    assert grid.neighbor_bytes(61, 0) == (ord("."), BORDER_BYTE, BORDER_BYTE, ord("b"))
+
+
 O = OrcaGrid.from_string
 
 
@@ -127,6 +180,93 @@ class TestGridPeekAndPoke(unittest.TestCase):
         # Then
         assert glyph is None
 
+        # When
+        grid.poke(-1, 0, "3")
+
+        # Then
+        assert grid.peek(-1, 0) is None
+        assert grid.peek(2, 0) == DOT_GLYPH
+
+    def test_peek_and_poke_byte(self):
+        # Given
+        grid = O(".A.\n...")
+
+        # When/Then
+        assert grid.peek_byte(1, 0) == ord("A")
+        assert grid.peek_byte(3, 0) is None
+        assert grid.peek_bytes([(1, 0), (0, 1), (-1, 0)]) == [ord("A"), ord("."), None]
+
+        # When/Then
+        # neighbors out of the grid are border bytes
+        neighbors = (BORDER_BYTE, ord("A"), BORDER_BYTE, ord("."))
+        assert grid.neighbor_bytes(0, 0) == neighbors
+        assert grid.peek_border_byte(1, 0) == ord("A")
+        assert grid.peek_border_byte(-1, 2) == BORDER_BYTE
+
+        # When
+        grid.poke_byte(2, 1, ord("3"))
+        grid.poke_byte(3, 1, ord("3"))
+
+        # Then
+        assert grid.peek(2, 1) == "3"
+        assert list(grid.iter_rows()) == [".A.", "..3"]
+
+    def test_copy_span(self):
+        # Given
+        grid = O("abcd\n....\n....")
+
+        # When
+        grid.copy_span(1, 0, 2, 1, 3)
+
+        # Then
+        # cells copied outside the grid are dropped
+        assert list(grid.iter_rows()) == ["abcd", "..bc", "...."]
+
+        # When
+        grid.copy_span(-1, 0, 0, 2, 2)
+
+        # Then
+        # cells copied from outside the grid are left as is
+        assert list(grid.iter_rows()) == ["abcd", "..bc", ".a.."]
+
+        # Given
+        grid = O("a本c\n...")
+
+        # When
+        grid.copy_span(0, 0, 0, 1, 3)
+
+        # Then
+        assert list(grid.iter_rows()) == ["a本c", "a本c"]
+
+        # Given
+        grid = O("abc...")
+
+        # When
+        # overlapping span in the same row
+        grid.copy_span(0, 0, 1, 0, 3)
+
+        # Then
+        # cells are copied one by one, so the first one is smeared
+        assert list(grid.iter_rows()) == ["aaaa.."]
+
+    def test_poke_non_ascii(self):
+        # Given
+        grid = O(".A.\n...")
+
+        # When
+        grid.poke(2, 1, "本")
+
+        # Then
+        assert grid.peek(2, 1) == "本"
+        assert list(grid.iter_rows()) == [".A.", "..本"]
+
+        # When
+        grid.poke(2, 1, "b")
+
+        # Then
+        assert grid.peek(2, 1) == "b"
+        assert list(grid.iter_rows()) == [".A.", "..b"]
+
 
 class TestGridCompatLayer(unittest.TestCase):
     def test_glyph_at(self):
@@ -191,6 +331,30 @@ class TestGridLook(unittest.TestCase):
         assert grid.is_locked(0, 1) is True
         assert grid.is_locked(0, 0) is False
 
+        # When
+        grid.lock_many([(2, 0), (1, 1), (5, 5), (-1, 0)])
+
+        # Then
+        assert grid.is_locked(2, 0) is True
+        assert grid.is_locked(1, 1) is True
+        assert grid.is_locked(2, 1) is False
+
+        # When
+        grid.lock_range(0, 1, 5)
+
+        # Then
+        assert grid.is_locked(0, 0) is False
+        assert grid.is_locked(1, 0) is True
+        assert grid.is_locked(0, 1) is True
+
+        # When
+        grid.lock_range(3, 0, 3)
+        grid.lock_range(1, -2, 0)
+
+        # Then
+        assert grid.is_locked(0, 1) is True
+        assert grid.is_locked(1, 1) is True
+
         # When
         value = grid.reset_locks()
 
@@ -200,6 +364,93 @@ class TestGridLook(unittest.TestCase):
                 assert grid.is_locked(x, y) is False
 
 
+class TestGridFindGlyphs(unittest.TestCase):
+    def test_find_glyphs(self):
+        # Given
+        grid = O(".A.\n*.a\n#:.")
+
+        # When
+        found = list(grid.find_glyphs("aA*:"))
+
+        # Then
+        assert found == [(1, 0, "A"), (0, 1, "*"), (2, 1, "a"), (1, 2, ":")]
+
+        # When
+        found = list(grid.find_glyphs("z"))
+
+        # Then
+        assert found == []
+
+    def test_find_byte(self):
+        # Given
+        grid = O("#.#.\n..#.")
+
+        # When/Then
+        assert grid.find_byte(ord("#"), 0, 0) == 0
+        assert grid.find_byte(ord("#"), 1, 0) == 2
+        assert grid.find_byte(ord("#"), 3, 0) is None
+        assert grid.find_byte(ord("#"), 0, 1) == 2
+
+
+class TestGridCachedOperators(unittest.TestCase):
+    def test_cached_operators(self):
+        # Given
+        grid = O(".A.\n...")
+        calls = []
+
+        def parse(grid):
+            calls.append(grid)
+            return [len(calls)]
+
+        # When
+        first = grid.cached_operators(parse)
+        second = grid.cached_operators(parse)
+
+        # Then
+        assert first == second == [1]
+
+        # When
+        # poking the same glyph does not change the grid
+        grid.poke(1, 0, "A")
+
+        # Then
+        assert grid.cached_operators(parse) == [1]
+
+        # When
+        grid.poke(1, 1, "3")
+
+        # Then
+        assert grid.cached_operators(parse) == [2]
+
+
+class TestGridInternOperator(unittest.TestCase):
+    def test_intern_operator(self):
+        # Given
+        grid = O(".A.\n...")
+
+        def factory(grid, glyph, x, y):
+            return object()
+
+        # When
+        first = grid.intern_operator(1, 0, "A", factory)
+
+        # Then
+        assert grid.intern_operator(1, 0, "A", factory) is first
+
+        # When
+        # another cell changes
+        grid.poke(0, 0, "1")
+
+        # Then
+        assert grid.intern_operator(1, 0, "A", factory) is first
+
+        # When
+        grid.poke(1, 0, "B")
+
+        # Then
+        assert grid.intern_operator(1, 0, "B", factory) is not first
+
+
 class TestGridListen(unittest.TestCase):
     def test_listen_default(self):
         # Given
@@ -300,3 +551,30 @@ class TestGridListen(unittest.TestCase):
 
         # Then
         assert value == 0
+
+    def test_listen_values(self):
+        # Given
+        grid = O(".A.\n*.c")
+        ports = [
+            InputPort(0, 0),
+            InputPort(0, 1, default="4"),
+            InputPort(1, 0, default="+"),
+            InputPort(2, 1, clamp=lambda x: min(x, 5)),
+            InputPort(3, 3, default="+"),
+        ]
+
+        # When
+        values = grid.listen_values(ports)
+
+        # Then
+        assert values == [grid.listen_as_value(port) for port in ports]
+        assert values == [0, 4, 10, 5, 0]
+
+        # When
+        # same, with ports at most one cell away from the grid
+        ports[-1] = InputPort(3, 2, default="+")
+        values = grid.listen_border_values(ports)
+
+        # Then
+        assert values == grid.listen_values(ports)
+        assert values == [0, 4, 10, 5, 0]